@@ -1,74 +1,557 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from collections import OrderedDict
 from tqdm import tqdm
+import queue
+import threading
 import zipfile
+import io
 import os
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+_write_lock = threading.Lock()
 
-def download_file(url):
+# One session for all requests: TCP/TLS connections are kept alive and reused for every chunk and every download
+# instead of a new handshake per request; pool size matches the amount of download workers
+MAX_WORKERS = 30
+SESSION = requests.Session()
+# Failed requests and temporary server errors are retried with increasing waiting time
+_retries = Retry(
+    total=5,
+    backoff_factor=0.3,
+    status_forcelist=[502, 503, 504],
+    allowed_methods=["GET", "HEAD"],
+)
+_adapter = HTTPAdapter(
+    pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS, max_retries=_retries
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+
+def _write_at(fd, data, offset):
+    """
+    Writes data at a byte position of a file without moving a shared file position.
+    Uses os.pwrite which is thread-safe without a lock; on Windows (no os.pwrite) seek and write are locked.
+
+    Args:
+        fd (int): File descriptor of the file opened for writing.
+        data (bytes-like): The data to write.
+        offset (int): The byte position to write the data at.
+    """
+    if hasattr(os, "pwrite"):
+        os.pwrite(fd, data, offset)
+    else:
+        with _write_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+
+
+class HttpRangeReader(io.RawIOBase):
+    """
+    Read-only file object which reads a remote file on demand with HTTP range requests.
+    zipfile reads the central directory at the end of the archive first and then seeks to each member,
+    so a ZIP file can be extracted directly from the server without saving the archive to disk.
+    Requested blocks are kept in a small LRU cache because zipfile reads the same region several times.
+
+    Args:
+        url (str): The URL of the file. The server has to support range requests.
+        file_size (int): The size of the file in bytes.
+        block_size (int): Size of one requested block in bytes. Defaults to 2 MB.
+        cache_blocks (int): Maximum amount of blocks kept in the cache. Defaults to 16.
+        session (requests.Session): Session used for the requests to reuse the connection. Defaults to None (new session).
+    """
+
+    def __init__(
+        self, url, file_size, block_size=1024 * 1024 * 2, cache_blocks=16, session=None
+    ):
+        self.url = url
+        self.file_size = file_size
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self._cache = OrderedDict()  # block number -> bytes, least recently used first
+        self._pos = 0
+        self.session = session if session is not None else requests.Session()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.file_size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def _get_block(self, block_no):
+        """
+        Returns a block of the file from the cache or requests it from the server.
+
+        Args:
+            block_no (int): The number of the block (byte position // block_size).
+        Returns:
+            bytes: The content of the block.
+        """
+        if block_no in self._cache:
+            self._cache.move_to_end(block_no)
+            return self._cache[block_no]
+
+        start = block_no * self.block_size
+        end = min(start + self.block_size, self.file_size) - 1
+        response = self.session.get(
+            self.url, headers={"Range": f"bytes={start}-{end}"}
+        )
+        response.raise_for_status()
+        # 200 instead of 206 means the server ignored the range and sent the whole file
+        if response.status_code != 206:
+            raise requests.exceptions.RequestException(
+                f"Server does not support range requests for {self.url}", response=response
+            )
+        block = response.content
+        # A shorter block would shift all following reads, reject it like an incomplete chunk
+        if len(block) != end - start + 1:
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Block {start}-{end} of {self.url} incomplete ({len(block)} bytes received)"
+            )
+
+        # Add block to cache and drop least recently used block if cache is full
+        self._cache[block_no] = block
+        if len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+        return block
+
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        # Don't read beyond the end of the file
+        size = min(len(view), max(0, self.file_size - self._pos))
+        n_read = 0
+        while n_read < size:
+            block_no, offset = divmod(self._pos, self.block_size)
+            block = self._get_block(block_no)
+            n = min(size - n_read, len(block) - offset)
+            if n <= 0:  # the block ends before the position, never loop without reading
+                raise requests.exceptions.ChunkedEncodingError(
+                    f"No data at byte {self._pos} of {self.url}"
+                )
+            view[n_read : n_read + n] = block[offset : offset + n]
+            n_read += n
+            self._pos += n
+        return n_read
+
+
+def _check_zip(filename):
+    """
+    Checks the structure of a downloaded ZIP file before extracting it.
+    The central directory at the end of the file has to be readable and every member has to start with a local
+    file header at the position listed there. This finds a truncated file or a misplaced chunk by reading only a few
+    bytes per member. The content itself is checked while extracting with the CRC32 checksums of the members.
+
+    Args:
+        filename (str): The name of the ZIP file.
+    Raises:
+        zipfile.BadZipFile: If the file is damaged.
+    """
+    with zipfile.ZipFile(filename, "r") as zip_ref, open(filename, "rb") as fob:
+        for member in zip_ref.infolist():
+            fob.seek(member.header_offset)
+            if fob.read(4) != zipfile.stringFileHeader:
+                raise zipfile.BadZipFile(
+                    f"{filename} is damaged at member {member.filename!r}. Delete it and download it again."
+                )
+
+
+def _extract_members(filename, members, path):
+    """
+    Extracts the given members of a ZIP file. Runs in a worker process of extract_zip with its own file handle.
+
+    Args:
+        filename (str): The name of the ZIP file.
+        members (list): Names of the members to extract.
+        path (str): The directory to extract the members to.
+    """
+    with zipfile.ZipFile(filename, "r") as zip_ref:
+        for member in members:
+            zip_ref.extract(member, path)
+
+
+def extract_zip(filename, path):
+    """
+    Extracts a ZIP file with several processes, each decompressing a part of the members.
+    Decompression is CPU bound, so with processes (not threads) the members are decompressed on all CPU cores.
+
+    Args:
+        filename (str): The name of the ZIP file.
+        path (str): The directory to extract the files to.
+    Returns:
+        None
+    """
+    with zipfile.ZipFile(filename, "r") as zip_ref:
+        members = [m for m in zip_ref.infolist() if not m.is_dir()]
+        # Create directories beforehand, otherwise processes would create the same directories at the same time
+        for member in zip_ref.infolist():
+            parts = os.path.dirname(member.filename).split("/")
+            os.makedirs(
+                os.path.join(path, *[p for p in parts if p not in ("", ".", "..")]),
+                exist_ok=True,
+            )
+
+    n_workers = min(os.cpu_count() or 1, len(members))
+    if n_workers <= 1:
+        with zipfile.ZipFile(filename, "r") as zip_ref:
+            zip_ref.extractall(path)
+        return
+
+    # Distribute members to the workers, biggest first to the worker with the least data so far
+    shards = [[] for _ in range(n_workers)]
+    shard_sizes = [0] * n_workers
+    for member in sorted(members, key=lambda m: m.file_size, reverse=True):
+        i = shard_sizes.index(min(shard_sizes))
+        shards[i].append(member.filename)
+        shard_sizes[i] += member.file_size
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(_extract_members, filename, shard, path) for shard in shards
+        ]
+        for future in futures:
+            future.result()
+
+
+def download_file(url, stream_extract=False):
     """
     Downloads a file from the specified URL and saves it to the local disk.
     Uses ThreadPoolExecutor to start multiple tasks and download data chunks concurrently for more download speed.
 
     Args:
         url (str): The URL of the file to download.
+        stream_extract (bool): If True and the server supports range requests, the ZIP file is extracted
+            directly from the server with HttpRangeReader without saving the archive to disk.
+            Needs only disk space for the extracted files, but reads with one connection instead of many.
+            Defaults to False.
     Returns:
         None
     """
 
-    def download_chunk(url, start, end, filename, pbar):
+    thread_data = threading.local()  # data of each worker thread
+
+    def download_chunk(session, url, start, end, fd, progress_q):
         """
         Downloads a chunk of data from the given URL and writes it to the specified file.
 
         Args:
+          session (requests.Session): The session whose pooled connections are used for the request.
           url (str): The URL to download the chunk from.
           start (int): The starting byte position of the chunk.
           end (int): The ending byte position of the chunk.
-          filename (str): The name of the file to write the chunk to.
-          pbar (ProgressBar): The progress bar to update after downloading the chunk.
+          fd (int): The file descriptor of the file to write the chunk to, shared by all threads.
+          progress_q (queue.SimpleQueue): Queue to report the amount of downloaded bytes to the progress bar.
+
+        Raises:
+          requests.exceptions.RequestException: If the server ignores the range.
+          requests.exceptions.ChunkedEncodingError: If the chunk is still incomplete after three attempts.
         """
-        response = requests.get(url, headers={"Range": f"bytes={start}-{end}"})
-        # open file in binary mode for reading and writting
-        with open(filename, "r+b") as fob:
-            # set start point at file object
-            fob.seek(start)
-            # write chunk at file object
-            fob.write(response.content)
-        # update progress bar after downloading chunk
-        pbar.update(end - start)
-
-    # get header of server
-    response = requests.head(url)
-    # file size specified in header
-    file_size = int(response.headers["content-length"])
-
-    chunk_size = 1024 * 1024 * 2  # 2^10 Bytes = 1048576 = 1024 *1024 = 1 MB
-    filename = url.split("/")[-1]
+        size = end - start + 1
+        # every thread reuses one buffer for all its chunks instead of allocating a new one per chunk
+        if len(getattr(thread_data, "buffer", b"")) < size:
+            thread_data.buffer = bytearray(size)
+        view = memoryview(thread_data.buffer)
 
-    # Create an empty file with file size containing null bites
-    with open(filename, "wb") as fob:
-        fob.write(b"\0" * file_size)
-
-    # Download each chunk of the file in a separate thread
-    # createprogress bat
-    with tqdm(total=file_size, unit="B", unit_scale=True, desc=filename) as pbar:
-        # multi-threaded (parallel) execution of tasks with ThreadPoolExecutor
-        with ThreadPoolExecutor(max_workers=30) as executor:
-            futures = []  # list of tasks; future is a referall to task
-            # iterate over file with spacing chunk_size
-            for start in range(0, file_size, chunk_size):
-                end = min(
-                    start + chunk_size - 1, file_size - 1
-                )  # end byte chunk, shouldnt exceed file_size
-                # submit task to executer, download chunk, append to future list showing task has sumbitted
-                futures.append(
-                    executor.submit(download_chunk, url, start, end, filename, pbar)
+        # Request chunk again if the connection breaks off before the whole chunk is received
+        for _ in range(3):
+            # identity encoding: the server sends the bytes of the file as they are, not compressed again
+            response = session.get(
+                url,
+                headers={"Range": f"bytes={start}-{end}", "Accept-Encoding": "identity"},
+                stream=True,
+            )
+            response.raise_for_status()
+            # read the raw socket bytes without urllib3 checking for and applying content decoding
+            response.raw.decode_content = False
+            # 200 instead of 206 means the server ignored the range and sends the whole file
+            if response.status_code != 206:
+                response.close()
+                raise requests.exceptions.RequestException(
+                    f"Server does not support range requests for {url}", response=response
                 )
-                # checking futures
-            for future in futures:
-                future.result()
 
-    # unzip, save and remove file
-    with zipfile.ZipFile(filename, "r") as zip_ref:
-        zip_ref.extractall("gip_data")
-    os.remove(filename)
+            # read raw bytes from the connection in 64 KB parts directly into the buffer (no content decoding, no extra copy)
+            n_bytes = 0
+            try:
+                while n_bytes < size:
+                    n = response.raw.readinto(
+                        view[n_bytes : min(n_bytes + 65536, size)]
+                    )
+                    if n == 0:  # connection closed
+                        break
+                    n_bytes += n
+            except urllib3.exceptions.HTTPError:  # connection broken off
+                pass
+            # release connection back to the pool
+            response.close()
+            if n_bytes == size:
+                break
+        else:
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Chunk {start}-{end} of {url} incomplete after 3 attempts"
+            )
+
+        # write chunk at its position in the file, only when it is complete
+        _write_at(fd, view[:n_bytes], start)
+        # report progress after downloading chunk; the progress bar is updated by report_progress
+        progress_q.put(n_bytes)
+
+    def report_progress(progress_q, pbar, stop):
+        """
+        Sums up the byte amounts reported by the workers every 100 ms and updates the progress bar once.
+        With one thread updating the bar the workers don't compete for the lock of the progress bar.
+
+        Args:
+          progress_q (queue.SimpleQueue): Queue with the amount of downloaded bytes per chunk.
+          pbar (ProgressBar): The progress bar to update.
+          stop (threading.Event): Event to stop the thread after a last update.
+        """
+        while True:
+            stopped = stop.wait(0.1)
+            n_bytes = 0
+            while not progress_q.empty():
+                n_bytes += progress_q.get_nowait()
+            if n_bytes:
+                pbar.update(n_bytes)
+            if stopped:
+                break
+
+    def download_chunks(session, url, filename, file_size, max_workers, etag=None):
+        """
+        Downloads a file in chunks with parallel range requests and writes them to the specified file.
+        Finished chunks are listed in a file '<filename>.parts'. If the download breaks off, a new call with the same
+        file version (same ETag) only downloads the missing chunks.
+
+        Args:
+          session (requests.Session): The session whose pooled connections are used for the requests.
+          url (str): The URL of the file to download.
+          filename (str): The name of the file to write to.
+          file_size (int): The size of the file in bytes.
+          max_workers (int): The maximum amount of threads downloading at the same time.
+          etag (str): The ETag of the file from the server. Without ETag an interrupted download can't be resumed.
+        """
+        # Chunk size depending on file size: about four chunks per worker, but between 1 MB and 16 MB
+        # 2^10 Bytes = 1048576 = 1024 *1024 = 1 MB
+        chunk_size = max(
+            1024 * 1024, min(file_size // (4 * max_workers), 1024 * 1024 * 16)
+        )
+        # Not more threads than chunks, e.g. a 5 MB file with 1 MB chunks needs only 5 threads
+        n_chunks = -(-file_size // chunk_size)  # rounded up
+        n_workers = max(1, min(max_workers, n_chunks))
+
+        # Resume only if the parts file belongs to the same file version and chunk layout
+        parts_filename = f"{filename}.parts"
+        parts_header = f"{etag} {file_size} {chunk_size}\n"
+        done_chunks = set()
+        if (
+            etag
+            and os.path.exists(parts_filename)
+            and os.path.exists(filename)
+            and os.path.getsize(filename) == file_size
+        ):
+            with open(parts_filename, "r") as fob:
+                lines = fob.readlines()
+            if lines and lines[0] == parts_header:
+                # lines without line break were not written completely
+                done_chunks = {int(line) for line in lines[1:] if line.endswith("\n")}
+
+        # The file is opened once and the descriptor is shared by all threads
+        flags = os.O_CREAT | os.O_RDWR | getattr(os, "O_BINARY", 0)
+        fd = os.open(filename, flags if done_chunks else flags | os.O_TRUNC, 0o644)
+        # (Re)write the parts file with only the complete lines of a previous call
+        parts_file = open(parts_filename, "w")
+        parts_file.writelines([parts_header] + [f"{start}\n" for start in done_chunks])
+        parts_file.flush()
+        parts_lock = threading.Lock()
+        # Set by the first failed chunk, so no further chunks are submitted
+        failed = threading.Event()
+
+        def record_part(future, start):
+            """Adds the start byte of a finished chunk to the parts file or records the failure of the chunk."""
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                with parts_lock:
+                    parts_file.write(f"{start}\n")
+                    parts_file.flush()
+            else:
+                failed.set()
+
+        try:
+            if not done_chunks:
+                # Create an empty file with file size; reserve the space without writing null bytes
+                if hasattr(os, "posix_fallocate"):  # only available on Linux
+                    os.posix_fallocate(fd, 0, file_size)
+                else:
+                    os.ftruncate(fd, file_size)
+
+            # Download each chunk of the file in a separate thread
+            # createprogress bat
+            with tqdm(
+                total=file_size,
+                initial=sum(min(chunk_size, file_size - s) for s in done_chunks),
+                unit="B",
+                unit_scale=True,
+                desc=filename,
+            ) as pbar:
+                progress_q = queue.SimpleQueue()
+                stop_progress = threading.Event()
+                progress_thread = threading.Thread(
+                    target=report_progress,
+                    args=(progress_q, pbar, stop_progress),
+                    daemon=True,
+                )
+                progress_thread.start()
+                # multi-threaded (parallel) execution of tasks with ThreadPoolExecutor
+                with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                    futures = []  # list of tasks; future is a referall to task
+                    # At most two chunks per worker are submitted at once, which bounds the memory of queued tasks
+                    in_flight = threading.BoundedSemaphore(n_workers * 2)
+                    # iterate over file with spacing chunk_size
+                    for start in range(0, file_size, chunk_size):
+                        if start in done_chunks:  # downloaded in a previous call
+                            continue
+                        end = min(
+                            start + chunk_size - 1, file_size - 1
+                        )  # end byte chunk, shouldnt exceed file_size
+                        # submit task to executer, download chunk, append to future list showing task has sumbitted
+                        in_flight.acquire()
+                        # stop submitting after a failed chunk, the error is raised below
+                        if failed.is_set():
+                            in_flight.release()
+                            break
+                        future = executor.submit(
+                            download_chunk, session, url, start, end, fd, progress_q
+                        )
+                        # record the chunk (or its failure) before a new chunk may be submitted
+                        future.add_done_callback(
+                            lambda f, start=start: record_part(f, start)
+                        )
+                        future.add_done_callback(lambda _: in_flight.release())
+                        futures.append(future)
+                    # checking futures in order of completion, so a failed chunk raises at once
+                    # instead of after all chunks submitted before it
+                    try:
+                        for future in as_completed(futures):
+                            future.result()
+                    except BaseException:
+                        # chunks which have not started yet are not downloaded anymore
+                        for future in futures:
+                            future.cancel()
+                        raise
+                    finally:
+                        # last update of the progress bar and stop progress thread
+                        stop_progress.set()
+                        progress_thread.join()
+        finally:
+            os.close(fd)
+            parts_file.close()
+
+        # All chunks are downloaded, the parts file is not needed anymore
+        os.remove(parts_filename)
+
+    def download_stream(response, filename):
+        """
+        Downloads a file in one stream, for servers which don't support range requests or send no file size.
+
+        Args:
+          response (requests.Response): The streamed response of a GET request for the whole file.
+          filename (str): The name of the file to write to.
+        """
+        with response:
+            response.raise_for_status()
+            file_size = response.headers.get("content-length")
+            with open(filename, "wb") as fob, tqdm(
+                total=int(file_size) if file_size else None,
+                unit="B",
+                unit_scale=True,
+                desc=filename,
+            ) as pbar:
+                for part in response.iter_content(chunk_size=1024 * 1024):
+                    fob.write(part)
+                    pbar.update(len(part))
+
+    def save_etag(etag_filename, etag):
+        """Saves the ETag of the downloaded file, so the next call can skip the download if the file is unchanged."""
+        if etag:
+            with open(etag_filename, "w") as fob:
+                fob.write(etag)
+
+    # Module-level session, connections stay open for later downloads as well
+    max_workers = MAX_WORKERS
+    session = SESSION
+
+    filename = url.split("/")[-1]
+
+    # ETag of the last download, saved next to the extracted files
+    etag_filename = os.path.join("gip_data", f"{filename}.etag")
+    headers = {}
+    if os.path.exists(etag_filename):
+        with open(etag_filename, "r") as fob:
+            headers["If-None-Match"] = fob.read().strip()
+
+    # Request only the first byte instead of a HEAD request: some servers refuse HEAD requests,
+    # and a server without range support already sends the whole file, which is then downloaded directly
+    headers["Range"] = "bytes=0-0"
+    headers["Accept-Encoding"] = "identity"
+    response = session.get(url, headers=headers, stream=True)
+    # 304 Not Modified: the file on the server is the same as the last downloaded one
+    if response.status_code == 304:
+        response.close()
+        print(f"{filename} has not changed since the last download. Skipping download.")
+        return
+    response.raise_for_status()
+    etag = response.headers.get("etag")
+    # Downloading in chunks needs a partial response (206) with the file size, e.g. 'Content-Range: bytes 0-0/12345'
+    content_range = response.headers.get("content-range", "")
+    supports_ranges = (
+        response.status_code == 206 and content_range.rsplit("/", 1)[-1].isdigit()
+    )
+    if supports_ranges:
+        file_size = int(content_range.rsplit("/", 1)[-1])
+        response.close()
+
+    # Unzip directly from the server, the archive itself is never written to disk
+    if stream_extract and supports_ranges:
+        with zipfile.ZipFile(
+            HttpRangeReader(url, file_size, session=session), "r"
+        ) as zip_ref:
+            zip_ref.extractall("gip_data")
+        save_etag(etag_filename, etag)
+        return
+
+    if supports_ranges:
+        download_chunks(session, url, filename, file_size, max_workers, etag)
+    else:
+        # Otherwise ranges would be ignored and each chunk would contain the beginning of the file
+        if response.status_code == 206:  # partial response without file size, request whole file
+            response.close()
+            response = session.get(url, stream=True)
+        download_stream(response, filename)
+
+    # check, unzip (in parallel), save and remove file
+    _check_zip(filename)
+    extract_zip(filename, "gip_data")
+    save_etag(etag_filename, etag)
+    # Removing a large file can take a while, remove it in the background while the caller continues
+    # (no daemon thread, so the file is still removed if Python exits before)
+    threading.Thread(target=os.remove, args=(filename,)).start()
@@ -1,12 +1,16 @@
 import os
 import zipfile
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 import codecs
+import weakref
 from datetime import datetime
 import geopandas as gpd
 import numpy as np
 from tqdm import tqdm
 import requests
+from requests.adapters import HTTPAdapter
 import osmnx
 import pandas as pd
 import networkx as nx
@@ -16,8 +20,10 @@ import plotly.graph_objects as go
 import contextily as cx
 import osm2geojson
 from shapely import line_merge
-from shapely import unary_union 
-from shapely.geometry import LineString
+from shapely import union_all, segmentize, intersects, prepare
+from shapely import box
+from shapely import intersection as shp_intersection
+from shapely import linestrings, get_coordinates, get_point, to_wkb
 from matplotlib_scalebar.scalebar import ScaleBar
 
 
@@ -42,7 +48,25 @@ def to_data_dict(
     - ls_classes (list): The updated list of dictionaries with the converted data.
     """
 
+    if clip:
+        # Dissolve the study area only once for all classes, buffered as clip mask with tolerance
+        # (union_all of shapely 2 instead of the deprecated unary_union, the area polygons may overlap so no coverage union)
+        area_union = union_all(gdf_area.geometry.values)
+        area_mask = area_union.buffer(1.5)
+        # Bounding box of the mask in EPSG:4326 to prefilter the features before projecting them
+        # (the box outline is densified, so the curved lines of the transformed box are covered too)
+        minx, miny, maxx, maxy = area_mask.bounds
+        area_envelope = segmentize(
+            area_mask.envelope, max_segment_length=max(maxx - minx, maxy - miny, 1) / 100
+        )
+        area_box_4326 = box(
+            *gpd.GeoSeries([area_envelope], crs=gdf_area.crs)
+            .to_crs("EPSG:4326")
+            .total_bounds
+        )
+
     for infr_class in ls_classes:
+        xml = None
         # Query with overpass turbo query statement defined above and save to xml string
         if infr_class["query"]:  # if query is empty, dict_own query was not defined by user
             xml_string = osm2geojson.overpass_call(infr_class["query"])
@@ -56,6 +80,7 @@ def to_data_dict(
                 encoding="utf-8",
             ) as f:
                 f.write(xml_string)
+            xml = xml_string  # keep the string, so the file has not to be read again for the gdf
 
         try:
             # Create osmnx graph and nodes / edges gdfs from it
@@ -68,18 +93,20 @@ def to_data_dict(
             if clip:  # Clip and reproject graph to exact study area if clip is True
                 G = osmnx.projection.project_graph(G, to_crs=crs)
                 G = osmnx.truncate.truncate_graph_polygon(
-                    G, gdf_area.unary_union, truncate_by_edge=True
+                    G, area_union, truncate_by_edge=True
                 )  # Clip graph to exact study area
 
             infr_class["graph"] = G
 
-            # Open again and create gdf from xml file, containing version and timestamp tags (should be the same like gdf_edges)
-            with codecs.open(
-                f'{diskpath}/osm_data/export_{infr_class["name"]}_osm2geojson.osm',
-                "r",
-                encoding="utf-8",
-            ) as data:
-                xml = data.read()
+            # Create gdf from xml, containing version and timestamp tags (should be the same like gdf_edges)
+            # Only open the xml file again if it was not just queried
+            if xml is None:
+                with codecs.open(
+                    f'{diskpath}/osm_data/export_{infr_class["name"]}_osm2geojson.osm',
+                    "r",
+                    encoding="utf-8",
+                ) as data:
+                    xml = data.read()
 
             geojson = osm2geojson.xml2geojson(
                 xml, filter_used_refs=False, log_level="INFO"
@@ -89,11 +116,18 @@ def to_data_dict(
             )
 
             if clip:  # Clip and reproject gdf to exact study area if clip is True
+                # Only features within the bounding box of the study area are projected
+                candidate_idx = np.sort(infr_class["gdf_xml"].sindex.query(area_box_4326))
+                infr_class["gdf_xml"] = infr_class["gdf_xml"].iloc[candidate_idx]
                 infr_class["gdf_xml"] = osmnx.projection.project_gdf(
                     infr_class["gdf_xml"], to_crs=crs
                 )
+                # Prefilter with the spatial index, so only features intersecting the study area are clipped
+                candidate_idx = np.sort(
+                    infr_class["gdf_xml"].sindex.query(area_mask, predicate="intersects")
+                )
                 infr_class["gdf_xml"] = gpd.clip(
-                    infr_class["gdf_xml"], gdf_area.geometry.buffer(1.5)
+                    infr_class["gdf_xml"].iloc[candidate_idx], area_mask
                 )  # Clip to exact study area with buffer tolerance
 
             infr_class["gdf_xml"] = infr_class["gdf_xml"].loc[
@@ -125,62 +159,50 @@ def to_data_dict(
 
 
 #####  FUNCTIONS EXTRINSIC ANALYSIS  #####
-def calculate_infr_length(row):
+# Values of cycleway keys for infrastructure which exists on both sides of the road (set for fast lookup)
+VALID_CYCLEWAY_VALUES = frozenset(["lane", "opposite_lane", "track", "opposite_track"])
+
+
+def calculate_infr_length(gdf):
     """
-    Calculates the actual infrastructure length based on the given row by multiplying the geom_length by 2
+    Calculates the actual infrastructure length for all features by multiplying the geom_length by 2
     if a key cycleway, cycleway:both, cycleway:left and cycleway:right is in the attributes.
     This features in OSM share one geometry, but are actually two separate infrastructures.
+    Works on the whole GeoDataFrame at once instead of row by row.
     Args:
-      row (pandas.Series): Row containing the data for the calculation and a column named 'geom_length' as feature geometry length.
+      gdf (GeoDataFrame): GeoDataFrame with a column 'tags' containing the tags as dictionary
+      and a column named 'geom_length' as feature geometry length.
     Returns:
-      pandas.Series: The updated row with the 'infr_length' calculated.
+      GeoDataFrame: The GeoDataFrame with the 'infr_length' column calculated.
     """
 
-    def check_valid_values(tag_dict, key):
+    def has_two_sides(tag_dict):
         """
-        Inner function, that checks if the value of a specific key in the tag dictionary is valid.
+        Inner function, that checks the cycleway keys of a tag dictionary in a single pass.
+        Every key is read once with dict.get and tested against the frozenset of valid values.
         Args:
           tag_dict (dict): The dictionary containing the tags.
-          key (str): The key to check.
         Returns:
-          bool: True if the value is valid, False otherwise.
+          bool: True if the infrastructure exists on both sides of the road, False otherwise.
         """
+        get = tag_dict.get
+        # Check for tag cycleway or cycleway:both
         if (
-            tag_dict[key] == "lane"
-            or tag_dict[key] == "opposite_lane"
-            or tag_dict[key] == "track"
-            or tag_dict[key] == "opposite_track"
+            get("cycleway") in VALID_CYCLEWAY_VALUES
+            or get("cycleway:both") in VALID_CYCLEWAY_VALUES
         ):
             return True
-        else:
-            return False
-
-    tag_dict = row.loc["tags"]
-
-    # Check for tag cycleway
-    if "cycleway" in tag_dict:
-        if check_valid_values(tag_dict, "cycleway"):
-            row.loc["infr_length"] = row.loc["geom_length"] * 2
-            return row
-
-    # Check for tag cycleway:both
-    if "cycleway:both" in tag_dict:
-        if check_valid_values(tag_dict, "cycleway:both"):
-            row.loc["infr_length"] = row.loc["geom_length"] * 2
-            return row
-
-    # Check for tag cycleway:left AND cycleway:right
-    if "cycleway:left" in tag_dict and "cycleway:right" in tag_dict:
-        if check_valid_values(tag_dict, "cycleway:left") and check_valid_values(
-            tag_dict, "cycleway:right"
-        ):
-            row.loc["infr_length"] = row.loc["geom_length"] * 2
-            return row
+        # Check for tag cycleway:left AND cycleway:right
+        return (
+            get("cycleway:left") in VALID_CYCLEWAY_VALUES
+            and get("cycleway:right") in VALID_CYCLEWAY_VALUES
+        )
 
-    # In all other cases, the infrastructure length is the same as the geometry length
-    row.loc["infr_length"] = row.loc["geom_length"]
+    two_sides = gdf["tags"].map(has_two_sides).astype(bool).to_numpy()
 
-    return row
+    # Double length if one of the checks is True, in all other cases the infrastructure length is the same as the geometry length
+    geom_length = gdf["geom_length"].to_numpy()
+    return gdf.assign(infr_length=np.where(two_sides, geom_length * 2, geom_length))
 
 
 def to_linestring(gdf):
@@ -222,104 +244,85 @@ def to_linestring(gdf):
     return gdf.reset_index(drop=True)  # reset index after dropping rows
 
 
-def clean_turnuse(row, gdf_radvis):
+def clean_turnuse(gdf_turnuse, gdf_radvis):
     """
     Check if the 'USE_FROM_ID' and 'USE_TO_ID' values connects each to a bicycle infrastructure; 
-    show therefore if row exist in the 'gdf_radvis_clip' DataFrame.
+    show therefore if the ids exist in the 'gip_lu_id' column of gdf_radvis.
 
     Parameters:
-    - row: pandas Series or DataFrame row containing the 'USE_FROM_ID' and 'USE_TO_ID' values.
+    - gdf_turnuse: GeoDataFrame containing the 'USE_FROM_ID' and 'USE_TO_ID' columns.
+    - gdf_radvis: GeoDataFrame containing the 'gip_lu_id' column.
     Returns:
-    - True if both 'USE_FROM_ID' and 'USE_TO_ID' values exist in gdf_radvis_clip 'gip_lu_id' row, False otherwise.
+    - Boolean Series, True for rows where both 'USE_FROM_ID' and 'USE_TO_ID' values exist in gdf_radvis 'gip_lu_id', False otherwise.
     """
-    id_from = row.loc["USE_FROM_ID"]
-    id_to = row.loc["USE_TO_ID"]
+    # Set of valid ids is hashed once, instead of searching the column for every row
+    valid_ids = set(gdf_radvis["gip_lu_id"].to_numpy())
 
-    if (
-        id_from in gdf_radvis["gip_lu_id"].values
-        and id_to in gdf_radvis["gip_lu_id"].values
-    ):
-        return True
-    else:
-        return False
+    return gdf_turnuse["USE_FROM_ID"].isin(valid_ids) & gdf_turnuse["USE_TO_ID"].isin(
+        valid_ids
+    )
 
 
-def classify_infr_class_gip(row):
+# GIP bike values of 'bike_tow' and 'bike_bkw' and their infrastructure class
+CYCLE_TRACKS_GIP = [
+    "GRW_M",
+    "GRW_MO",
+    "GRW_T",
+    "GRW_TO",
+    "MTB",
+    "RFUE",
+    "RW",
+    "RWO",
+    "SGT",
+    "TRR",
+    "SCHUTZWEG_RFUE",
+    "GRW_MV",
+    "GRW_MOV",
+]
+CYCLE_LANES_GIP = ["MZSTR", "RF"]
+CALM_TRAFFIC_WAYS_GIP = [
+    "BGZ",
+    "FRS",
+    "FUZO",
+    "FUZO_N",
+    "RVW",
+    "VK_BE",
+    "WSTR",
+    "WSTR_N",
+]
+TAG_TO_CLASS_GIP = {
+    **{tag: "Cycle Tracks" for tag in CYCLE_TRACKS_GIP},
+    **{tag: "Cycle Lanes" for tag in CYCLE_LANES_GIP},
+    **{tag: "Calm Traffic Ways" for tag in CALM_TRAFFIC_WAYS_GIP},
+}
+
+
+def classify_infr_class_gip(gdf):
     """
     Classifies the infrastructure class (Cycle Lanes, Cycle Tracks, Calm Traffic Ways) based on column values of 'bike_tow' and 'bike_bkw'.
     Assigns 'infr_class' column with the classification or pd.NA if the values conflicts between 'bike_tow' and 'bike_bkw'.
+    Works on the whole GeoDataFrame at once instead of row by row.
     Args:
-        row (pandas.Series): The row containing the 'bike_tow' and 'bike_bkw' columns.
+        gdf (GeoDataFrame): The GeoDataFrame containing the 'bike_tow' and 'bike_bkw' columns.
     Returns:
-        pandas.Series: The row with the 'infr_class' column updated based on the classification.
+        GeoDataFrame: The GeoDataFrame with the 'infr_class' column updated based on the classification.
     """
-    cycle_tracks = [
-        "GRW_M",
-        "GRW_MO",
-        "GRW_T",
-        "GRW_TO",
-        "MTB",
-        "RFUE",
-        "RW",
-        "RWO",
-        "SGT",
-        "TRR",
-        "SCHUTZWEG_RFUE",
-        "GRW_MV",
-        "GRW_MOV",
-    ]
-    cycle_lanes = ["MZSTR", "RF"]
-    calm_traffic_ways = [
-        "BGZ",
-        "FRS",
-        "FUZO",
-        "FUZO_N",
-        "RVW",
-        "VK_BE",
-        "WSTR",
-        "WSTR_N",
-    ]
+    # Class of the value in straight ahead and opposite direction (NaN if the value is in no class)
+    cls_tow = gdf["bike_tow"].map(TAG_TO_CLASS_GIP)
+    cls_bkw = gdf["bike_bkw"].map(TAG_TO_CLASS_GIP)
 
     # Different values in straight ahead and opposite direction which conflicts between the classes Cycle Lanes, Cycle Tracks, Calm Traffic Ways
-    conditions = [
-        (row.loc["bike_tow"] in cycle_tracks and row.loc["bike_bkw"] in cycle_lanes),
-        (
-            row.loc["bike_tow"] in cycle_tracks
-            and row.loc["bike_bkw"] in calm_traffic_ways
-        ),
-        (
-            row.loc["bike_tow"] in cycle_lanes
-            and row.loc["bike_bkw"] in calm_traffic_ways
-        ),
-        (row.loc["bike_tow"] in cycle_lanes and row.loc["bike_bkw"] in cycle_tracks),
-        (
-            row.loc["bike_tow"] in calm_traffic_ways
-            and row.loc["bike_bkw"] in cycle_lanes
-        ),
-        (
-            row.loc["bike_tow"] in calm_traffic_ways
-            and row.loc["bike_bkw"] in cycle_tracks
-        ),
-    ]
-    if any(conditions):
+    conflict = cls_tow.notna() & cls_bkw.notna() & (cls_tow != cls_bkw)
+    for idf_use_id in gdf.loc[conflict, "idf_use_id"]:
         print(
-            f"feature with id {row.loc['idf_use_id']} seems to have conflicting values in bike_tow and bike_bkw"
+            f"feature with id {idf_use_id} seems to have conflicting values in bike_tow and bike_bkw"
         )
-        row.loc["infr_class"] = np.nan
-    # Else both values are in the same class, so we can assign the infr_class
-    elif row.loc["bike_tow"] in cycle_tracks or row.loc["bike_bkw"] in cycle_tracks:
-        row.loc["infr_class"] = "Cycle Tracks"
-    elif row.loc["bike_tow"] in cycle_lanes or row.loc["bike_bkw"] in cycle_lanes:
-        row.loc["infr_class"] = "Cycle Lanes"
-    elif (
-        row.loc["bike_tow"] in calm_traffic_ways
-        or row.loc["bike_bkw"] in calm_traffic_ways
-    ):
-        row.loc["infr_class"] = "Calm Traffic Ways"
-    # Any other (edge) case, assign None
-    else:
-        row.loc["infr_class"] = np.nan
-    return row
+
+    # Else both values are in the same class or only one value has a class, so we can assign the infr_class
+    # Any other (edge) case stays NaN
+    infr_class = cls_tow.fillna(cls_bkw).mask(conflict, np.nan)
+
+    return gdf.assign(infr_class=infr_class)
 
 
 def create_node_edge_model(
@@ -344,91 +347,87 @@ def create_node_edge_model(
 
     #### DICT TURNUSE CONNECTION AMOUNT AND DICT NODES  COORDINATES ####
     # Calculate how much turnuse connections each intersection node has and save it in a dictionary with node id as key
-    dict_turnuse_connection_amount = {}
-    for _, line in gdf_turnuse_cleaned.iterrows():
-        # If already in dict_help_turnuse add 1 for further connection
-        if line.VIA_NODE_ID in dict_turnuse_connection_amount.keys():
-            dict_turnuse_connection_amount[line.VIA_NODE_ID] += 1
-        else:
-            dict_turnuse_connection_amount[line.VIA_NODE_ID] = 1
+    # (unsorted, so the node ids keep the order of their first appearance)
+    dict_turnuse_connection_amount = (
+        gdf_turnuse_cleaned["VIA_NODE_ID"].value_counts(sort=False).to_dict()
+    )
 
     # Dict of intersection nodes geometry/coordinates: 
     # built dict to call from every node the geometry/coordinates with its OBJECTID
-    dict_help_nodes = {}
-    for _, node in gdf_gip_nodes.iterrows():
-        node_coor = node.geometry.coords[0]
-        dict_help_nodes[node.OBJECTID] = node_coor
+    coords_x = gdf_gip_nodes.geometry.x.to_numpy()
+    coords_y = gdf_gip_nodes.geometry.y.to_numpy()
+    dict_help_nodes = dict(
+        zip(gdf_gip_nodes["OBJECTID"].to_numpy(), zip(coords_x, coords_y))
+    )
 
     #### NEW MODEL CONSTRUCTION ####
     # Get intersection node geometry and built new LineString to it with first and last point of every turnuse LineString
     # As a result, every edge is then connected with the node at intersections (node-edge model)
-    connected_lines = []
-    attributes = []
-    for _, line in gdf_turnuse_cleaned.iterrows():
-        if line.VIA_NODE_ID in dict_help_nodes.keys():
-            first_coord = line.geometry.coords[0]
-            last_coord = line.geometry.coords[-1]
-            key = line.VIA_NODE_ID
-            node_coord = dict_help_nodes[key]
-
-            # If there are only 1 or 2 connections via a node, connect edges directly (because Turnuse line is then also
-            # connected directly, connecting over intersection node would take a detour) otherwise connect them via intersection node
-            # For connections, create new LineString and add original Turnuse attributes
-
-            if (
-                dict_turnuse_connection_amount[line.VIA_NODE_ID] == 1
-                or dict_turnuse_connection_amount[line.VIA_NODE_ID] == 2
-            ):
-                new_line = LineString([first_coord, last_coord])
-                connected_lines.append(new_line)
-                attributes.append(
-                    {
-                        "VIA_NODE_ID": line.VIA_NODE_ID,
-                        "USE_TO_ID": line.USE_TO_ID,
-                        "USE_FROM_ID": line.USE_FROM_ID,
-                        "TURNUSE_OBJECTID": line.OBJECTID,
-                        "TIMESTAMP": line.TIMESTAMP,
-                        "infr_class": "Turnuse",
-                    }
-                )
+    # Only turnuse lines with a known intersection node can be connected
+    gdf_turnuse_via = gdf_turnuse_cleaned[
+        gdf_turnuse_cleaned["VIA_NODE_ID"].isin(dict_help_nodes.keys())
+    ]
 
-            else:
-                new_line = LineString([first_coord, node_coord])
-                new_line2 = LineString([last_coord, node_coord])
-                connected_lines.append(new_line)
-                attributes.append(
-                    {
-                        "VIA_NODE_ID": line.VIA_NODE_ID,
-                        "USE_TO_ID": line.USE_TO_ID,
-                        "USE_FROM_ID": line.USE_FROM_ID,
-                        "TURNUSE_OBJECTID": line.OBJECTID,
-                        "TIMESTAMP": line.TIMESTAMP,
-                        "infr_class": "Turnuse",
-                    }
-                )
-                connected_lines.append(new_line2)
-                attributes.append(
-                    {
-                        "VIA_NODE_ID": line.VIA_NODE_ID,
-                        "USE_TO_ID": line.USE_TO_ID,
-                        "USE_FROM_ID": line.USE_FROM_ID,
-                        "TURNUSE_OBJECTID": line.OBJECTID,
-                        "TIMESTAMP": line.TIMESTAMP,
-                        "infr_class": "Turnuse",
-                    }
-                )
+    # First and last point of every turnuse LineString from one coordinate array
+    coords, coords_index = get_coordinates(
+        gdf_turnuse_via.geometry.values, return_index=True
+    )
+    positions = np.arange(len(gdf_turnuse_via))
+    first_coords = coords[np.searchsorted(coords_index, positions, side="left")]
+    last_coords = coords[np.searchsorted(coords_index, positions, side="right") - 1]
+    node_coords = np.array(
+        [dict_help_nodes[key] for key in gdf_turnuse_via["VIA_NODE_ID"]], dtype=float
+    ).reshape(-1, 2)
+
+    # If there are only 1 or 2 connections via a node, connect edges directly (because Turnuse line is then also
+    # connected directly, connecting over intersection node would take a detour) otherwise connect them via intersection node
+    direct = (
+        gdf_turnuse_via["VIA_NODE_ID"].map(dict_turnuse_connection_amount).to_numpy()
+        <= 2
+    )
 
-    # All linestrings in list as new gdf
-    gdf_node_connections = gpd.GeoDataFrame(
-        geometry=connected_lines, crs=gdf_turnuse_cleaned.crs
+    # Start and end points of all new LineStrings: direct connections, then first point and last point to the node
+    line_starts = np.concatenate(
+        [first_coords[direct], first_coords[~direct], last_coords[~direct]]
+    )
+    line_ends = np.concatenate(
+        [last_coords[direct], node_coords[~direct], node_coords[~direct]]
+    )
+    # Restore the order of the turnuse lines (first point before last point), so dropping duplicates keeps the same rows
+    line_positions = np.concatenate(
+        [positions[direct], positions[~direct], positions[~direct]]
+    )
+    line_sub = np.concatenate(
+        [
+            np.zeros(direct.sum(), dtype=int),
+            np.zeros((~direct).sum(), dtype=int),
+            np.ones((~direct).sum(), dtype=int),
+        ]
+    )
+    order = np.lexsort((line_sub, line_positions))
+    connected_lines = linestrings(
+        np.stack([line_starts[order], line_ends[order]], axis=1)
     )
 
-    # Add attributes to the GeoDataFrame
-    for attr_name in attributes[0].keys():
-        gdf_node_connections[attr_name] = [attr[attr_name] for attr in attributes]
+    # All linestrings as new gdf with the original Turnuse attributes
+    turnuse_rows = gdf_turnuse_via.iloc[line_positions[order]]
+    gdf_node_connections = gpd.GeoDataFrame(
+        {
+            "VIA_NODE_ID": turnuse_rows["VIA_NODE_ID"].to_numpy(),
+            "USE_TO_ID": turnuse_rows["USE_TO_ID"].to_numpy(),
+            "USE_FROM_ID": turnuse_rows["USE_FROM_ID"].to_numpy(),
+            "TURNUSE_OBJECTID": turnuse_rows["OBJECTID"].to_numpy(),
+            "TIMESTAMP": turnuse_rows["TIMESTAMP"].to_numpy(),
+            "infr_class": "Turnuse",
+        },
+        geometry=connected_lines,
+        crs=gdf_turnuse_cleaned.crs,
+    )
 
     # Drop duplicates because from every turnuse a new connection line was made and edges are connected to > 2 turnuse lines
-    gdf_node_connections.drop_duplicates(subset="geometry", inplace=True)
+    # Compare the WKB of the lines (built in one call) instead of hashing every geometry object
+    geometry_wkb = pd.Series(to_wkb(gdf_node_connections.geometry.values))
+    gdf_node_connections = gdf_node_connections[~geometry_wkb.duplicated().to_numpy()]
 
     # Stack connections and radvis edges together to have new edge-node model
     gdf_connected_node_radvis = gpd.GeoDataFrame(
@@ -484,20 +483,19 @@ def get_dangling_nodes(network_edges, network_nodes):
         dangling_nodes (gdf): geodataframe with all dangling nodes
     """
 
-    edges = network_edges.copy(deep=True)
-    nodes = network_nodes.copy(deep=True)
+    # Edges and nodes are only read, so no copies are needed
+    edges = network_edges
+    nodes = network_nodes
 
     if "u" not in edges.columns:
 
-        all_node_occurences = (
-            edges.reset_index().u.to_list() + edges.reset_index().v.to_list()
-        )
-
-    else:
+        edges = edges.reset_index()
 
-        all_node_occurences = edges.u.to_list() + edges.v.to_list()
+    all_node_occurences = np.concatenate([edges["u"].to_numpy(), edges["v"].to_numpy()])
 
-    dead_ends = [x for x in all_node_occurences if all_node_occurences.count(x) == 1]
+    # Count all occurences in a single pass instead of counting each node in the whole list
+    counts = Counter(all_node_occurences)
+    dead_ends = [x for x, c in counts.items() if c == 1]
 
     dangling_nodes = nodes[nodes.index.isin(dead_ends)]
 
@@ -514,25 +512,30 @@ def get_subgraphs(graph):
     list: A list of tuples, where each tuple contains a subgraph and its length of geometry.
     """
 
-    def tags_to_dict(row):
-        """Put tags saved in columns into a own column consisting of a dictionary."""
-        row["tags"] = row.to_dict()
-        return row
-
-    # Get all disconnected components as own subgraphs
-    ls_G_components = [graph.subgraph(C).copy() for C in nx.connected_components(graph)]
-    # Get edges of subgraphs
+    # Get the component of every node from all disconnected components
+    node_component = {
+        node: i
+        for i, component in enumerate(nx.connected_components(graph))
+        for node in component
+    }
+    # Get edges of the whole graph once and split them by the component of their start node
+    # (instead of copying every component as own subgraph and converting each of them separately)
+    edges = osmnx.graph_to_gdfs(graph, nodes=False, edges=True)
+    edge_components = edges.index.get_level_values("u").map(node_component).to_numpy()
+    # Columns of attributes which no edge in the component has are dropped, as they would be for the subgraph
     ls_edge_components = [
-        osmnx.graph_to_gdfs(c, nodes=False, edges=True) for c in ls_G_components
+        e.dropna(axis=1, how="all")
+        for _, e in edges.groupby(edge_components)
     ]
 
     # Replace edges with a tuple containing the edges and the total infrastructure length of the component
     # Calculate the length of the geometry with 'calculate_infr_length' func., create a new column with tags as dictionary as preparation
     ls_edge_components_with_length = []
     for e in ls_edge_components:
-        e = e.apply(tags_to_dict, axis=1)
+        # Put tags saved in columns into a own column consisting of a dictionary (one dict per row, built at once)
+        e = e.assign(tags=e.to_dict("records"))
         e["geom_length"] = e["geometry"].length
-        e = e.apply(calculate_infr_length, axis=1)  # adds infr_length column
+        e = calculate_infr_length(e)  # adds infr_length column
         l_sum = e["infr_length"].sum()
         ls_edge_components_with_length.append((e, l_sum))
 
@@ -593,41 +596,44 @@ def find_adjacent_components(components, edge_id, buffer_dist, crs):
         component_buffer_sjoin.component_left != component_buffer_sjoin.component_right
     ].copy()
 
-    left_ids = intersecting_buffer_components[edge_id + "_left"].to_list()
-    right_ids = intersecting_buffer_components[edge_id + "_right"].to_list()
-
-    adjacent_edges_all = list(zip(left_ids, right_ids))
-    adjacent_edges_all = [set(a) for a in adjacent_edges_all]
-
-    # Remove duplicaties
-    adjacent_edges = []
-    for item in adjacent_edges_all:
-        if item not in adjacent_edges:
-            adjacent_edges.append(item)
+    left_ids = intersecting_buffer_components[edge_id + "_left"].to_numpy()
+    right_ids = intersecting_buffer_components[edge_id + "_right"].to_numpy()
 
-    adjacent_edges = [tuple(a) for a in adjacent_edges]
-
-    all_results = {}
-
-    for i in range(len(adjacent_edges)):
-        intersection = gpd.overlay(
-            component_edges_buffer.loc[
-                component_edges_buffer[edge_id] == adjacent_edges[i][0]
-            ],
-            component_edges_buffer.loc[
-                component_edges_buffer[edge_id] == adjacent_edges[i][1]
-            ],
-            how="intersection",
+    # Remove duplicaties, pairs are sorted so (a, b) and (b, a) are the same pair
+    if np.issubdtype(left_ids.dtype, np.integer) and np.issubdtype(
+        right_ids.dtype, np.integer
+    ):
+        # Integer ids: sort and deduplicate the pairs as numpy array (first occurences in original order)
+        pairs = np.sort(np.column_stack([left_ids, right_ids]), axis=1)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        _, first_idx = np.unique(pairs, axis=0, return_index=True)
+        adjacent_edges = [tuple(pair) for pair in pairs[np.sort(first_idx)].tolist()]
+    else:
+        # Any other ids: pairs as tuples in a dict (dict keeps the order)
+        adjacent_edges = list(
+            dict.fromkeys(
+                tuple(sorted((l, r))) for l, r in zip(left_ids, right_ids) if l != r
+            )
         )
 
-        geom = intersection.geometry.centroid.values[0]
-
-        results = {}
-        results[edge_id + "_left"] = adjacent_edges[i][0]
-        results[edge_id + "_right"] = adjacent_edges[i][1]
-        results["geometry"] = geom
-
-        all_results[i] = results
+    # Intersect the buffers of all adjacent edge pairs at once instead of one overlay per pair
+    edge_buffers = (
+        component_edges_buffer.drop_duplicates(subset=edge_id).set_index(edge_id).geometry
+    )
+    left_geoms = edge_buffers.loc[[a[0] for a in adjacent_edges]].values
+    right_geoms = edge_buffers.loc[[a[1] for a in adjacent_edges]].values
+
+    intersections = gpd.GeoSeries(shp_intersection(left_geoms, right_geoms), crs=crs)
+    centroids = intersections.centroid.values
+
+    all_results = {
+        i: {
+            edge_id + "_left": adjacent_edges[i][0],
+            edge_id + "_right": adjacent_edges[i][1],
+            "geometry": centroids[i],
+        }
+        for i in range(len(adjacent_edges))
+    }
 
     return all_results
 
@@ -727,12 +733,12 @@ def get_class_lengths(gdf, infr_class, lengthcolumn):
     Returns:
     float: The total length of the specified infrastructure class in kilometers and rounded.
     """
-    if infr_class == "Total":
-        gdf_class = gdf
-    else:
-        gdf_class = gdf[gdf["infr_class"] == infr_class]
+    # Sum on the numpy arrays, without slicing a copy of the GeoDataFrame (NaN values are skipped like in pandas)
+    lengths = gdf[lengthcolumn].to_numpy(dtype=float)
+    if infr_class != "Total":
+        lengths = lengths[gdf["infr_class"].to_numpy() == infr_class]
 
-    length = round(gdf_class[lengthcolumn].sum() / 1000, 3)
+    length = round(np.nansum(lengths) / 1000, 3)
 
     return length
 
@@ -751,14 +757,29 @@ def create_grid_geometry(gdf, cell_size):
     Returns:
         grid (gdf): gdf with grid cells in same crs as input data
     """
-    geometry = gdf["geometry"].unary_union
-    geometry_cut = osmnx.utils_geo._quadrat_cut_geometry(
-        geometry, quadrat_width=cell_size
-    )
-
-    grid = gpd.GeoDataFrame(geometry=[geometry_cut], crs=gdf.crs)
-
+    geometry = union_all(gdf["geometry"].values)
+
+    # Same evenly spaced grid lines as osmnx.utils_geo._quadrat_cut_geometry (at least 3 in each direction),
+    # but all cells are built as boxes at once instead of splitting the area line by line
+    left, bottom, right, top = geometry.bounds
+    x_num = int(np.ceil((right - left) / cell_size) + 1)
+    y_num = int(np.ceil((top - bottom) / cell_size) + 1)
+    x_points = np.linspace(left, right, num=max(x_num, 3))
+    y_points = np.linspace(bottom, top, num=max(y_num, 3))
+    x_min, y_min = np.meshgrid(x_points[:-1], y_points[:-1])
+    x_max, y_max = np.meshgrid(x_points[1:], y_points[1:])
+    cells = box(x_min.ravel(), y_min.ravel(), x_max.ravel(), y_max.ravel())
+
+    # Cut the area with all cells in one vectorized call (only cells intersecting the prepared area)
+    prepare(geometry)
+    cells = cells[intersects(geometry, cells)]
+    geometry_cut = shp_intersection(cells, geometry)
+
+    grid = gpd.GeoDataFrame(geometry=geometry_cut, crs=gdf.crs)
+
+    # Split cells with several parts and keep only polygons (cells which only touch the area give lines or points)
     grid = grid.explode(index_parts=False, ignore_index=True)
+    grid = grid[(grid.geom_type == "Polygon") & (grid.area > 0)].reset_index(drop=True)
 
     # Create arbitraty grid id col
     grid["grid_id"] = grid.index
@@ -782,17 +803,17 @@ def get_grid_density(gdf, infra, length, grid):
 
     # Group by grid id and sum the infrastructure length for each cell up
     if infra == "Total":
-        length_pergrid = gdf.groupby(by="grid_id")[length].sum().to_frame()
+        length_pergrid = gdf.groupby(by="grid_id", sort=False)[length].sum().to_frame()
     else:
         length_pergrid = (
             gdf.loc[gdf["infr_class"] == infra]
-            .groupby(by="grid_id")[length]
+            .groupby(by="grid_id", sort=False)[length]
             .sum()
             .to_frame()
         )
 
-    # Merge the serial with infrastructure length with the grid
-    return grid.merge(length_pergrid, on="grid_id")
+    # Join the serial with infrastructure length (indexed by grid id) to the grid, keeping the order of the grid
+    return grid.join(length_pergrid, on="grid_id", how="inner").reset_index(drop=True)
 
 
 def get_grid_length_diff(grid_w_lengths_osm, grid_w_lengths_gip, basegrid):
@@ -809,28 +830,34 @@ def get_grid_length_diff(grid_w_lengths_osm, grid_w_lengths_gip, basegrid):
     in length between OSM and GIP features for each cell in the grid.
     """
 
-    # Create new grid with length of gip features and fill NaN values with 0
-    grid_length_diff = basegrid.merge(
-        grid_w_lengths_gip[["geom_length", "grid_id"]], on="grid_id", how="left"
+    # Align the length of gip and osm features on the grid id in one frame and fill NaN values with 0
+    lengths = (
+        pd.concat(
+            [
+                grid_w_lengths_gip.set_index("grid_id")["geom_length"].rename("length_gip"),
+                grid_w_lengths_osm.set_index("grid_id")["infr_length"].rename("length_osm"),
+            ],
+            axis=1,
+        )
+        .reindex(basegrid["grid_id"].unique())
+        .fillna(0)
     )
-    grid_length_diff = grid_length_diff.rename(columns={"geom_length": "length_gip"})
-    grid_length_diff["length_gip"] = grid_length_diff["length_gip"].fillna(0)
 
-    # Create new grid with length of osm features and fill NaN values with 0
-    grid_length_diff = grid_length_diff.merge(
-        grid_w_lengths_osm[["infr_length", "grid_id"]], on="grid_id", how="left"
-    )
-    grid_length_diff = grid_length_diff.rename(columns={"infr_length": "length_osm"})
-    grid_length_diff["length_osm"] = grid_length_diff["length_osm"].fillna(0)
+    # Create new grid with both lengths (one join instead of two merges)
+    grid_length_diff = basegrid.join(lengths, on="grid_id").reset_index(drop=True)
 
     # Calculate absolute difference of the both length for each cell
-    grid_length_diff["diff_absolute"] = round(
-        (grid_length_diff["length_gip"] - grid_length_diff["length_osm"])
+    grid_length_diff["diff_absolute"] = np.round(
+        grid_length_diff["length_gip"].to_numpy() - grid_length_diff["length_osm"].to_numpy()
     )
 
     return grid_length_diff
 
 
+# Default GeoDataFrames of fill_empty_gdf by CRS
+_EMPTY_GDF_TEMPLATES = {}
+
+
 def fill_empty_gdf(gdf, crs):
     """
     Fills an empty GeoDataFrame with default values and returns a new GeoDataFrame.
@@ -844,22 +871,26 @@ def fill_empty_gdf(gdf, crs):
     otherwise returns the input GeoDataFrame as is.
     """
     if gdf.empty:
-        data = {"infr_length": [0], "geom_length": [0]}
-        gdf_new = gpd.GeoDataFrame(
-            data,
-            columns=[
-                "empty",
-                "version",
-                "timestamp",
-                "geometry",
-                "tags",
-                "geom_length",
-                "grid_id",
-                "infr_length",
-            ],
-            geometry="geometry",
-            crs=crs,
-        )
+        # The default GeoDataFrame is created only once per CRS and copied for every call
+        crs_key = str(crs) if crs else None
+        if crs_key not in _EMPTY_GDF_TEMPLATES:
+            data = {"infr_length": [0], "geom_length": [0]}
+            _EMPTY_GDF_TEMPLATES[crs_key] = gpd.GeoDataFrame(
+                data,
+                columns=[
+                    "empty",
+                    "version",
+                    "timestamp",
+                    "geometry",
+                    "tags",
+                    "geom_length",
+                    "grid_id",
+                    "infr_length",
+                ],
+                geometry="geometry",
+                crs=crs,
+            )
+        gdf_new = _EMPTY_GDF_TEMPLATES[crs_key].copy()
         return gdf_new
     else:
         return gdf
@@ -876,56 +907,50 @@ def to_osmnx_graph(gdf_gdf_to_graph):
     G_gip (networkx.MultiDiGraph): The OSMNX graph representation of the input GeoDataFrame.
     """
 
-    ### Create node GeoDataFrame ###
-    nodes = []
-    for line in gdf_gdf_to_graph["geometry"]:
-        for x, y in [
-            line.coords[0],
-            line.coords[-1],
-        ]:  # get coordinates of first and last point
-            node_id = hash(
-                (x, y)
-            )  # Create a unique id for the node (a pseudo osmid, which is also named 'osmid')
-            nodes.append({"osmid": node_id, "x": x, "y": y})
-
-    # Nodes to gdf
-    df_nodes = pd.DataFrame(nodes).drop_duplicates().set_index("osmid")
-    gdf_nodes = gpd.GeoDataFrame(
-        df_nodes, geometry=gpd.points_from_xy(df_nodes.x, df_nodes.y)
+    ### Create nodes ###
+    # Get coordinates of first and last point of all lines at once, as (N, 2) arrays
+    geoms = gdf_gdf_to_graph["geometry"].values
+    first_coords = get_coordinates(get_point(geoms, 0))
+    last_coords = get_coordinates(get_point(geoms, -1))
+
+    # Unique endpoints are the nodes, the inverse index gives u and v of every line
+    # Nodes are numbered in order of their first appearance (the row index is the pseudo osmid, which is also named 'osmid')
+    points = np.concatenate([first_coords, last_coords])
+    unique_points, first_idx, inverse = np.unique(
+        points, axis=0, return_index=True, return_inverse=True
     )
-
-    # Create a dictionary with all nodes as key and index (osmid) as value from gdf_nodes
-    coord_to_index = {
-        node.geometry.coords[0]: index for index, node in gdf_nodes.iterrows()
-    }
-
-    ### Create edge GeoDataFrame ###
-    edges = []
-    for line in gdf_gdf_to_graph["geometry"]:
-        u = coord_to_index.get(
-            line.coords[0]
-        )  # get osmid from gdf_nodes dictionary for start point of line
-        v = coord_to_index.get(
-            line.coords[-1]
-        )  # get osmid from gdf_nodes dictionary for end point of line
-        key = hash(u)  # just random unique id for hash
-        edges.append({"u": u, "v": v, "key": key, "geometry": line})
-
-    # Create a GeoDataFrame from Edges list
-    gdf_edges = gpd.GeoDataFrame(edges, geometry="geometry").set_index(
-        ["u", "v", "key"]
+    order = np.argsort(first_idx, kind="stable")
+    node_ids = np.empty(len(order), dtype=np.int64)
+    node_ids[order] = np.arange(len(order))
+    unique_points = unique_points[order]
+
+    # osmid of start point (u) and end point (v) of every line
+    uv = node_ids[inverse.reshape(-1)].reshape(2, -1)
+
+    ### Create (directed) graph directly from the arrays ###
+    # Same graph as osmnx.graph_from_gdfs would build, without creating node and edge GeoDataFrames first
+    G_gip = nx.MultiDiGraph(crs=gdf_gdf_to_graph.crs)
+    G_gip.add_nodes_from(
+        (osmid, {"x": x, "y": y})
+        for osmid, (x, y) in enumerate(unique_points.tolist())
+    )
+    # Edge key is the row number of the line, so parallel lines between the same nodes stay separate edges
+    edge_keys = np.arange(len(geoms), dtype=np.int64)
+    G_gip.add_edges_from(
+        (u, v, key, {"geometry": line})
+        for u, v, key, line in zip(
+            uv[0].tolist(), uv[1].tolist(), edge_keys.tolist(), geoms
+        )
     )
-
-    # Set the CRS to match the original GeoDataFrame
-    gdf_edges.crs = gdf_gdf_to_graph.crs
-
-    # To (directed) graph
-    G_gip = osmnx.graph_from_gdfs(gdf_nodes, gdf_edges)
 
     return G_gip
 
 
 #### FUNCTIONS INTRINSIC ANALYSIS ####
+# Undirected graphs with edge bearings of plot_infr by their input graph (removed with the input graph)
+_BEARING_GRAPHS = weakref.WeakKeyDictionary()
+
+
 def plot_infr(dict_class, label, nominatim_area):
     """
     Plot infrastructure on a map (with contextily) and their orientation (with osmnx).
@@ -961,8 +986,12 @@ def plot_infr(dict_class, label, nominatim_area):
 
         # calculate bearing and orientation 
         # https://osmnx--1106.org.readthedocs.build/en/1106/user-reference.html#osmnx.plot.plot_orientation
-        G = osmnx.bearing.add_edge_bearings(dict_class["graph"])
-        G = osmnx.convert.to_undirected(G)
+        # The undirected graph with bearings is kept per graph, so plotting the same graph again skips the conversion
+        G = _BEARING_GRAPHS.get(dict_class["graph"])
+        if G is None:
+            G = osmnx.bearing.add_edge_bearings(dict_class["graph"])
+            G = osmnx.convert.to_undirected(G)
+            _BEARING_GRAPHS[dict_class["graph"]] = G
         osmnx.plot.plot_orientation(
             G, figsize=(1.5, 1.5), color=dict_class["color"], linewidth=0.1
         )
@@ -970,6 +999,48 @@ def plot_infr(dict_class, label, nominatim_area):
         print(f"There are are no {label} in {nominatim_area}!")
 
 
+# Session for the OHSOME API requests, connections are kept alive and reused by all fetches
+_ohsome_session = requests.Session()
+_ohsome_session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+
+
+@lru_cache(maxsize=64)
+def _fetch_ohsome(URL, area, date, filter_str):
+    """
+    Fetches the development of the infrastructure of one filter over time from the OHSOME API.
+    Results are cached, so plotting the same area again doesn't send the requests again.
+    Args:
+        URL (string): OSHOME API URL.
+        area (geojson string): Area in GEOJSON format.
+        date (string): Time query string for OHSOME.
+        filter_str (string): OHSOME filter of the infrastructure class.
+    Returns:
+        tuple: Tuple of the times (year-month) and the values.
+    """
+    # Fetch OHSOME API
+    data = {"bpolys": area, "format": "json", "time": date, "filter": filter_str}
+    response = _ohsome_session.post(URL, data=data, timeout=240)
+
+    # Convert result-property into list
+    ls = response.json()["result"]
+
+    if not ls:
+        return ((), ())
+
+    # Extract time and values from the dictionaries in one pass into a DataFrame
+    df_result = pd.DataFrame.from_records(ls)
+    time_col = "timestamp" if "timestamp" in df_result.columns else "fromTimestamp"
+
+    # Extract year and month of all timestamps at once
+    time_ls = (
+        pd.to_datetime(df_result[time_col], format="ISO8601").dt.strftime("%Y-%m").tolist()
+    )
+    value_ls = df_result["value"].tolist()
+
+    # Tuples, so the cached result can't be changed by the caller
+    return (tuple(time_ls), tuple(value_ls))
+
+
 def load_plot(area, URL, querydict, roads=False, ylabel="Value"):
     """
     Plots a chart of the development of the infrastructure classes cycle tracks, cycle lanes, calm traffic ways
@@ -995,36 +1066,28 @@ def load_plot(area, URL, querydict, roads=False, ylabel="Value"):
     year = dt_2_months_delay.strftime("%Y")
     month = dt_2_months_delay.strftime("%m")
 
-    def inner_fetch(filter_str):
-
-        date = f"2007-10-08/{year}-{month}-01/P3M"  # special query string for OHSOME: from 2007-10-08 to current date with 6 month interval
-        # Fetch OHSOME API
-        data = {"bpolys": area, "format": "json", "time": date, "filter": filter_str}
-        response = requests.post(URL, data=data, timeout=240)
-
-        # Convert result-property into list
-        ls = response.json()["result"]
+    date = f"2007-10-08/{year}-{month}-01/P3M"  # special query string for OHSOME: from 2007-10-08 to current date with 6 month interval
 
-        # Extract time and values from the dictionaries and put into a list
-        try:
-            time_ls = [item["timestamp"] for item in ls]
-        except Exception:
-            time_ls = [item["fromTimestamp"] for item in ls]
-
-        value_ls = [item["value"] for item in ls]
-
-        # Extract year and month
-        time_ls = [date.split("-") for date in time_ls]
-        time_ls = [f"{date[0]}-{date[1]}" for date in time_ls]
+    # CREATE FIGURE AND FETCH DATA
 
-        return [time_ls, value_ls]
-
-    # CREATE FIGURE AND CALL INNER_FETCH
-
-    # Fetch data
-    time_value_ls_cycle_tracks = inner_fetch(opwizquery_cycle_tracks)
-    time_value_ls_cycle_lanes = inner_fetch(opwizquery_cycle_lanes)
-    time_value_ls_calm_traffic_ways = inner_fetch(opwizquery_calm_traffic_ways)
+    # Fetch data of all plotted classes at the same time (the requests wait mostly for the API)
+    filters = [
+        opwizquery_cycle_tracks,
+        opwizquery_cycle_lanes,
+        opwizquery_calm_traffic_ways,
+    ]
+    if roads:
+        filters.append(opwizquery_main_roads)
+    if opwizquery_own:
+        filters.append(opwizquery_own)
+    with ThreadPoolExecutor(max_workers=len(filters)) as executor:
+        results = list(executor.map(partial(_fetch_ohsome, URL, area, date), filters))
+    (
+        time_value_ls_cycle_tracks,
+        time_value_ls_cycle_lanes,
+        time_value_ls_calm_traffic_ways,
+    ) = results[:3]
+    results = results[3:]
 
     # Create a figure
     fig = go.Figure()
@@ -1060,7 +1123,7 @@ def load_plot(area, URL, querydict, roads=False, ylabel="Value"):
 
     # If roads and own parameter is set, plot also main roads or own infrastructure
     if roads:
-        time_value_ls_main_roads = inner_fetch(opwizquery_main_roads)
+        time_value_ls_main_roads = results.pop(0)
         fig.add_trace(
             go.Scatter(
                 x=time_value_ls_main_roads[0],
@@ -1071,7 +1134,7 @@ def load_plot(area, URL, querydict, roads=False, ylabel="Value"):
             )
         )
     if opwizquery_own:
-        time_value_ls_own = inner_fetch(opwizquery_own)
+        time_value_ls_own = results.pop(0)
         fig.add_trace(
             go.Scatter(
                 x=time_value_ls_own[0],
@@ -1120,7 +1183,8 @@ def calculate_attribute_amount(gdf):
     GeoDataFrame: The updated GeoDataFrame with the 'attribute_amount' column added.
     """
 
-    gdf['attribute_amount'] = gdf.apply(lambda row: len(row.tags), axis=1)
+    # len of every tags dictionary in one pass over the column (int32 is enough for an amount of tags)
+    gdf['attribute_amount'] = gdf['tags'].map(len).astype(np.int32)
     return gdf
 
 
@@ -1138,23 +1202,25 @@ def group_by_edge_id(gdf, crs,edge_id_col='edge_id'):
         GeoDataFrame (grouped dataframe): New grouped GeoDataFrame
     """
 
-    # Group by edge_id
-    groups = gdf.groupby([edge_id_col])
-
-    # Merge geometries and attributes
-    merged_rows = []
-    for _, group in groups:
-        united_lines = unary_union(group.geometry)
-        merged_lines = line_merge(united_lines)
-        # Assuming all other attributes are the same (all segments w. same edge_id = one edge = same attributes), 
-        # take the first row and replace the geometry
-        new_row = group.iloc[0].copy()
-        new_row.geometry = merged_lines
-        merged_rows.append(new_row)
-
-    # Recreate GeoDataFrame and convert MultiLineStrings to LineStrings
-    new_gdf = gpd.GeoDataFrame(merged_rows, crs=crs)
-    new_gdf.explode(index_parts=False, inplace=True)
+    geometry_col = gdf.geometry.name
+
+    # Assuming all other attributes are the same (all segments w. same edge_id = one edge = same attributes),
+    # take the first row of every edge_id (sorted by edge_id like the groups)
+    first_rows = (
+        gdf[gdf[edge_id_col].notna()]
+        .drop_duplicates(subset=edge_id_col)
+        .sort_values(edge_id_col, kind="stable")
+    )
+
+    # Merge geometries of every edge_id at once: dissolve unites them, line_merge merges them in one vectorized call
+    united_lines = gdf[[edge_id_col, geometry_col]].dissolve(by=edge_id_col)
+    merged_lines = line_merge(united_lines.geometry.values)
+
+    # Recreate GeoDataFrame with the merged geometries, one row per edge_id
+    new_gdf = gpd.GeoDataFrame(
+        first_rows.drop(columns=geometry_col),
+        geometry=gpd.GeoSeries(merged_lines, index=first_rows.index, crs=crs),
+    )
     return new_gdf
 
 
@@ -1172,10 +1238,15 @@ def calculate_match_proportion(matched_edges, unmatched_edges, length_col, infr_
     float: The match proportion between matched and unmatched edges in % rounded to the nearest integer.
     """
 
+    # Lengths as numpy arrays, filtered by a mask instead of slicing copies of both frames
+    matched_len = matched_edges[length_col].to_numpy(dtype=float)
+    unmatched_len = unmatched_edges[length_col].to_numpy(dtype=float)
     if infr_class:
-        matched_edges = matched_edges.loc[matched_edges['infr_class'] == infr_class]
-        unmatched_edges = unmatched_edges.loc[unmatched_edges['infr_class'] == infr_class]
-  
-    sum_unmatched_matched = matched_edges[length_col].sum() + unmatched_edges[length_col].sum()
-    prop = ((sum_unmatched_matched -  unmatched_edges[length_col].sum()) / sum_unmatched_matched) * 100
+        matched_len = matched_len[matched_edges['infr_class'].to_numpy() == infr_class]
+        unmatched_len = unmatched_len[unmatched_edges['infr_class'].to_numpy() == infr_class]
+
+    # Every column is summed only once (NaN values are skipped like in pandas)
+    sum_matched = np.nansum(matched_len)
+    sum_unmatched = np.nansum(unmatched_len)
+    prop = (sum_matched / (sum_matched + sum_unmatched)) * 100
     return round(prop, 1)